@@ -268,6 +268,10 @@ def learner ( model,
                 break
             stop_after_n_epochs -= 1
 
+    # Closing log file of logger (custom loggers may not have one)
+    if run_logger is not None and hasattr(run_logger, "close_log"):
+        run_logger.close_log()
+
     t111 = time.perf_counter()
     if verbose:
         print("  -> Time = %f s"%(t111-t000))
@@ -2,12 +2,16 @@ import torch
 import numpy as np
 import pandas as pd
 import time
+import csv
+import collections
+import os
+import warnings
 
 import matplotlib.pyplot as plt
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 from matplotlib.lines import Line2D
 import matplotlib.gridspec as gridspec
-from sklearn.neighbors import KernelDensity
+from scipy.ndimage import gaussian_filter1d
 from IPython.display import display, clear_output
 
 # Fig params
@@ -15,37 +19,170 @@ plt.rc('text', usetex=True)
 plt.rc('font', family='serif')
 plt.rc('font', size=16)
 
+# Initial number of epochs that per-epoch history buffers can hold (capacity is doubled when full)
+HISTORY_BUFFER_INIT_CAPACITY = 64
+# Per-epoch histories kept in memory-mapped files rather than RAM when enabled (size ~ n_epochs x batch_size)
+MEMMAP_HISTORIES = ["R_history"]
+# Write buffer size (in bytes) of log file
+LOG_FILE_BUFFER_SIZE = 2**20
+# Max number of programs outputs kept in fit plot cache of RunVisualiser
+Y_PLOT_CACHE_SIZE = 4096
+# Max number of programs pretty str kept in print cache of RunVisualiser
+PRETTY_STR_CACHE_SIZE = 8
+
+def smoothed_densities (samples, x_min, x_max, n_bins, bandwidth):
+    """
+    Estimates probability densities of several sets of samples at once using histograms smoothed by a gaussian kernel
+    (approximates gaussian kernel density estimates at the cost of a single histogram pass).
+    Parameters
+    ----------
+    samples : list of numpy.array of shape (?,) of float
+        Sets of samples (can have different sizes).
+    x_min : float
+        Lower bound of density range.
+    x_max : float
+        Upper bound of density range.
+    n_bins : int
+        Number of bins.
+    bandwidth : float
+        Standard deviation of gaussian kernel.
+    Returns
+    -------
+    bins_centers, dens : numpy.array of shape (n_bins,) of float, numpy.array of shape (len(samples), n_bins,) of float
+        Centers of bins, density at bins of each set of samples (NaNs for empty sets).
+    """
+    n_sets    = len(samples)
+    bin_width = (x_max - x_min)/n_bins
+    # Flattening all sets, keeping track of set of each sample
+    sizes    = np.array([data.shape[0] for data in samples], dtype=int)                          # (n_sets,)
+    data     = np.concatenate(samples).astype(float)                                              # (n_samples,)
+    set_idx  = np.repeat(np.arange(n_sets), sizes)                                                # (n_samples,)
+    # Bin of each sample (x_max being included in last bin), discarding out of range samples
+    bin_idx  = np.minimum(np.floor((data - x_min)/bin_width), n_bins - 1)                         # (n_samples,)
+    in_range = (data >= x_min) & (data <= x_max)                                                  # (n_samples,)
+    flat_idx = set_idx[in_range]*n_bins + bin_idx[in_range].astype(int)                           # (n_in_range,)
+    # Histograms of all sets
+    hist = np.bincount(flat_idx, minlength=n_sets*n_bins).reshape(n_sets, n_bins)                 # (n_sets, n_bins)
+    # Smoothing
+    dens = smooth_histograms(hist, bin_width=bin_width, bandwidth=bandwidth)                      # (n_sets, n_bins)
+    bins_centers = x_min + (np.arange(n_bins) + 0.5)*bin_width
+    return bins_centers, dens
+
+def smooth_histograms (hist, bin_width, bandwidth):
+    """
+    Converts histograms into probability densities smoothed by a gaussian kernel.
+    Parameters
+    ----------
+    hist : numpy.array of shape (n_sets, n_bins,) of int
+        Counts of samples in each bin for each set of samples.
+    bin_width : float
+        Width of bins.
+    bandwidth : float
+        Standard deviation of gaussian kernel.
+    Returns
+    -------
+    dens : numpy.array of shape (n_sets, n_bins,) of float
+        Density at bins of each set of samples (NaNs for empty sets).
+    """
+    sizes = hist.sum(axis=-1)                                                                     # (n_sets,)
+    dens  = gaussian_filter1d(hist.astype(float), sigma=bandwidth/bin_width, axis=-1, mode='constant')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dens = dens/(sizes[:, np.newaxis]*bin_width)
+    return dens
+
+def get_pareto_update (complexities, rewards, pareto_rewards):
+    """
+    Finds Pareto candidates to replace with programs of a batch : for each complexity present in batch, the program
+    having this complexity and the max reward replaces the current candidate of this complexity if its reward is higher
+    or equal (or if there is no candidate yet). In case of ties within batch, the first program is used.
+    Parameters
+    ----------
+    complexities : numpy.array of shape (batch_size,) of float
+        Complexities of programs in batch (rounded to nearest int).
+    rewards : numpy.array of shape (batch_size,) of float
+        Rewards of programs in batch.
+    pareto_rewards : numpy.array of shape (n_complexities,) of float
+        Rewards of current candidates with candidate i having complexity i (NaN if no candidate yet).
+    Returns
+    -------
+    slots, arg_in_batch : numpy.array of shape (?,) of int, numpy.array of shape (?,) of int
+        Complexities of candidates to replace, idx in batch of programs replacing them.
+    """
+    # Complexity of each program in batch, discarding complexities having no candidate slot
+    buckets      = complexities.round().astype(np.int64)                                          # (batch_size,)
+    arg_in_range = np.flatnonzero((buckets >= 0) & (buckets < pareto_rewards.shape[0]))
+    # Idx in batch sorted by complexity then by decreasing reward (stable: first program wins ties)
+    order = arg_in_range[np.lexsort((-rewards[arg_in_range], buckets[arg_in_range]))]
+    # Start of each complexity segment = program having this complexity and having max reward
+    sorted_buckets     = buckets[order]
+    is_segment_start   = np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]][:order.shape[0]]
+    arg_have_c_and_max = order[is_segment_start]                                                  # (n_present,)
+    present_buckets    = sorted_buckets[is_segment_start]                                         # (n_present,)
+    max_r_at_c         = rewards[arg_have_c_and_max]                                              # (n_present,)
+    # If reward > currently max reward for this complexity or empty, replace
+    curr_pareto_r = pareto_rewards[present_buckets]
+    do_replace    = (curr_pareto_r <= max_r_at_c) | np.isnan(curr_pareto_r)
+    return present_buckets[do_replace], arg_have_c_and_max[do_replace]
+
+def floats_to_str (values):
+    """
+    Converts floats to str at their own precision with NaNs as empty str (as in pandas csv export).
+    Parameters
+    ----------
+    values : numpy.array of shape (?,) of float
+        Values to convert.
+    Returns
+    -------
+    values_str : list of str
+    """
+    values = np.asarray(values)
+    return np.where(np.isnan(values), '', values.astype(str)).tolist()
+
 class RunLogger:
     """
     Custom logger function.
+    When saving, the log file is kept open across epochs and must be closed with close_log once the run is over
+    (physo.learn.learn.learner does so).
+    Parameters
+    ----------
+    save_path : str or None
+        Path of log file.
+    do_save : bool
+        Saves log of all programs of each epoch to save_path.
+    do_memmap : bool
+        Keeps histories listed in MEMMAP_HISTORIES (full batch rewards, size ~ n_epochs x batch_size) in raw
+        memory-mapped files next to the log (save_path with extension replaced by '_<name>.dat') rather than in RAM.
+        Only used when saving. Files are padded to buffer capacity, have no header and are left on disk after the run
+        (they can be deleted once the logger is no longer used). False by default.
     """
 
-    def __init__ (self, save_path = None, do_save = False):
+    def __init__ (self, save_path = None, do_save = False, do_memmap = False):
         self.save_path = save_path
         self.do_save   = do_save
+        self.do_memmap = do_memmap
+        # Log file handle kept open across epochs (see save_log)
+        self._log_file   = None
+        self._log_writer = None
         self.initialize()
 
     def initialize (self):
+        # Closing log file of previous run if any
+        self.close_log()
 
         # Epoch specific
         self.epoch = None
 
-        self.overall_max_R_history         = []
         self.overall_best_prog_str_history = []
         self.hall_of_fame                  = []
 
-        self.epochs_history               = []
-        self.loss_history                 = []
-
-        self.mean_R_train_history         = []
-        self.mean_R_history               = []
-        self.max_R_history                = []
-
-        self.R_history                    = []
-        self.R_history_train              = []
+        # Preallocated per-epoch buffers, exposed as views over logged epochs (see _get_history)
+        # (epochs_history, loss_history, mean_R_train_history, mean_R_history, max_R_history, overall_max_R_history,
+        # best_prog_complexity_history, mean_complexity_history, n_physical, n_rewarded, R_history, R_history_train,
+        # lengths_of_physical_hist, lengths_of_unphysical_hist)
+        self._n_logged = 0
+        self._buffers  = {}
 
         self.best_prog_epoch_str_history  = []
-        self.best_prog_complexity_history = []
 
         self.best_prog_epoch_str_prefix_history   = []
         self.overall_best_prog_str_prefix_history = []
@@ -53,12 +190,6 @@ class RunLogger:
         self.best_prog_epoch_free_const_history   = []
         self.overall_best_prog_free_const_history = []
 
-        self.mean_complexity_history      = []
-
-        self.n_physical                   = []
-        self.n_rewarded                   = []
-        self.lengths_of_physical          = []
-        self.lengths_of_unphysical        = []
 
     def log(self, epoch, batch, model, rewards, keep, notkept, loss_val):
 
@@ -68,32 +199,36 @@ class RunLogger:
         self.batch   = batch
         self.keep    = keep
         self.notkept = notkept
+        # Batch rewards statistics (each computed once)
         best_prog_idx_epoch  = rewards.argmax()
+        max_R                = rewards[best_prog_idx_epoch]
+        R_train              = rewards[keep]
         self.best_prog_epoch = batch.programs.get_prog(best_prog_idx_epoch)
         self.programs_epoch  = batch.programs.get_programs_array()
 
 
         if epoch == 0:
             self.free_const_names            = [tok.__str__() for tok in self.batch.library.free_constants_tokens]
-            self.overall_max_R_history       = [rewards.max()]
-            self.hall_of_fame                = [batch.programs.get_prog(best_prog_idx_epoch)]
+            self.hall_of_fame                = [self.best_prog_epoch]
+            overall_max_R = max_R
         if epoch> 0:
-            if rewards.max() > np.max(self.overall_max_R_history):
-                self.overall_max_R_history.append(rewards.max())
-                self.hall_of_fame.append(batch.programs.get_prog(best_prog_idx_epoch))
+            # Overall max history being non-decreasing, its last value is its max
+            if max_R > self.overall_max_R_history[-1]:
+                overall_max_R = max_R
+                self.hall_of_fame.append(self.best_prog_epoch)
             else:
-                self.overall_max_R_history.append(self.overall_max_R_history[-1])
+                overall_max_R = self.overall_max_R_history[-1]
+        self._log_to_buffer("overall_max_R_history" , overall_max_R                     )
 
-        self.epochs_history         .append( epoch                             )
-        self.loss_history           .append( loss_val.detach().cpu().numpy()   )
+        self._log_to_buffer("epochs_history"        , epoch                             )
+        self._log_to_buffer("loss_history"          , loss_val.detach().cpu().numpy()   )
 
-        self.mean_R_train_history   .append( rewards[keep].mean()              )
-        self.mean_R_history         .append( rewards.mean()                    )
-        self.max_R_history          .append( rewards.max()                     )
+        self._log_to_buffer("mean_R_train_history"  , R_train.mean()                    )
+        self._log_to_buffer("mean_R_history"        , rewards.mean()                    )
+        self._log_to_buffer("max_R_history"         , max_R                             )
 
-
-        self.R_history              .append( rewards                           )
-        self.R_history_train        .append( rewards[keep]                     )
+        self._log_to_buffer("R_history"       , rewards )
+        self._log_to_buffer("R_history_train" , R_train )
 
         self.best_prog_epoch_str_history    .append( self.best_prog_epoch .get_infix_str() )
         self.overall_best_prog_str_history  .append( self.best_prog       .get_infix_str() )
@@ -105,16 +240,17 @@ class RunLogger:
         self.best_prog_epoch_free_const_history   .append( self.best_prog_epoch.free_const_values.detach().cpu().numpy().__str__() )
         self.overall_best_prog_free_const_history .append( self.best_prog      .free_const_values.detach().cpu().numpy().__str__())
 
-        self.best_prog_complexity_history .append(batch.programs.tokens.complexity[best_prog_idx_epoch].sum())
-        self.mean_complexity_history      .append(batch.programs.tokens.complexity.sum(axis=1).mean())
+        self._log_to_buffer("best_prog_complexity_history" , batch.programs.tokens.complexity[best_prog_idx_epoch].sum())
+        self._log_to_buffer("mean_complexity_history"      , batch.programs.tokens.complexity.sum(axis=1).mean())
 
-        self.R_history_array        = np.array(self.R_history)
-        self.R_history_train_array  = np.array(self.R_history_train)
+        self._log_to_buffer("n_physical" , batch.programs.is_physical.sum() )
+        self._log_to_buffer("n_rewarded" , (rewards > 0.).sum()             )
+        # Lengths distributions as histograms of lengths 0 to max_time_step
+        n_lengths, is_physical = batch.programs.n_lengths, batch.programs.is_physical
+        self._log_to_buffer("lengths_of_physical_hist"   , np.bincount(n_lengths[ is_physical], minlength=batch.max_time_step+1))
+        self._log_to_buffer("lengths_of_unphysical_hist" , np.bincount(n_lengths[~is_physical], minlength=batch.max_time_step+1))
 
-        self.n_physical              .append( batch.programs.is_physical.sum() )
-        self.n_rewarded              .append( (rewards > 0.).sum()             )
-        self.lengths_of_physical     .append( self.batch.programs.n_lengths[ self.batch.programs.is_physical] )
-        self.lengths_of_unphysical   .append( self.batch.programs.n_lengths[~self.batch.programs.is_physical] )
+        self._n_logged += 1
 
         self.pareto_logger()
 
@@ -122,44 +258,188 @@ class RunLogger:
         if self.do_save:
             self.save_log()
 
-    def save_log (self):
+    def _log_to_buffer (self, name, values):
+        """
+        Writes current epoch's values in per-epoch buffer named name. Buffer is allocated at first call with
+        HISTORY_BUFFER_INIT_CAPACITY epochs and its capacity is doubled whenever it is full. Buffers listed in
+        MEMMAP_HISTORIES are backed by a memory-mapped file (save_path with extension replaced by '_<name>.dat') when
+        do_memmap and do_save are True.
+        Parameters
+        ----------
+        name : str
+            Name of buffer.
+        values : numpy.array of shape (?,) or scalar
+            Values of current epoch.
+        """
+        values = np.asarray(values)
+        buffer = self._buffers.get(name)
+        if buffer is None:
+            shape = (HISTORY_BUFFER_INIT_CAPACITY,) + values.shape
+            # Full batch histories are spilled to memory-mapped files next to log if enabled
+            if name in MEMMAP_HISTORIES and self.do_memmap and self.do_save and self.save_path is not None:
+                filename = os.path.splitext(self.save_path)[0] + "_%s.dat"%(name)
+                try:
+                    buffer = np.memmap(filename, dtype=values.dtype, mode='w+', shape=shape)
+                except OSError as e:
+                    warnings.warn("Unable to create memory-mapped file %s (%s), keeping %s in memory."%(filename, e, name))
+                    buffer = None
+            if buffer is None:
+                buffer = np.empty(shape=shape, dtype=values.dtype)
+        elif self._n_logged >= buffer.shape[0]:
+            shape = (2*buffer.shape[0],) + buffer.shape[1:]
+            # Memory-mapped file is extended in place
+            new_buffer = None
+            if isinstance(buffer, np.memmap):
+                buffer.flush()
+                try:
+                    new_buffer = np.memmap(buffer.filename, dtype=buffer.dtype, mode='r+', shape=shape)
+                except OSError as e:
+                    warnings.warn("Unable to extend memory-mapped file %s (%s), keeping %s in memory."%(buffer.filename, e, name))
+            if new_buffer is None:
+                new_buffer = np.empty(shape=shape, dtype=buffer.dtype)
+                new_buffer[:buffer.shape[0]] = buffer
+            buffer = new_buffer
+        buffer[self._n_logged] = values
+        self._buffers[name] = buffer
+
+    def _get_history (self, name):
+        """
+        Returns view over logged epochs of per-epoch buffer named name.
+        Parameters
+        ----------
+        name : str
+            Name of buffer.
+        Returns
+        -------
+        history : numpy.array of shape (n_logged, ?,)
+        """
+        buffer = self._buffers.get(name)
+        if buffer is None:
+            return np.array([])
+        return buffer[:self._n_logged]
+
+    @property
+    def epochs_history(self):
+        return self._get_history("epochs_history")
+
+    @property
+    def loss_history(self):
+        return self._get_history("loss_history")
 
-        columns = ['epoch', 'reward', 'complexity', 'length', 'is_physical', 'is_elite', 'program', "program_prefix"]
-        # Columns for free const names
-        columns += self.free_const_names
+    @property
+    def mean_R_train_history(self):
+        return self._get_history("mean_R_train_history")
+
+    @property
+    def mean_R_history(self):
+        return self._get_history("mean_R_history")
+
+    @property
+    def max_R_history(self):
+        return self._get_history("max_R_history")
+
+    @property
+    def overall_max_R_history(self):
+        return self._get_history("overall_max_R_history")
+
+    @property
+    def best_prog_complexity_history(self):
+        return self._get_history("best_prog_complexity_history")
+
+    @property
+    def mean_complexity_history(self):
+        return self._get_history("mean_complexity_history")
+
+    @property
+    def n_physical(self):
+        return self._get_history("n_physical")
+
+    @property
+    def n_rewarded(self):
+        return self._get_history("n_rewarded")
+
+    @property
+    def lengths_of_physical_hist(self):
+        return self._get_history("lengths_of_physical_hist")
+
+    @property
+    def lengths_of_unphysical_hist(self):
+        return self._get_history("lengths_of_unphysical_hist")
 
-        # Initial df
+    @property
+    def R_history_array(self):
+        return self._get_history("R_history")
+
+    @property
+    def R_history_train_array(self):
+        return self._get_history("R_history_train")
+
+    # Aliases kept for backward compatibility
+    R_history       = R_history_array
+    R_history_train = R_history_train_array
+
+    # Lengths of programs at each epoch rebuilt from histograms, kept for backward compatibility (lengths of each epoch
+    # are sorted rather than in batch order)
+    @property
+    def lengths_of_physical(self):
+        return [np.repeat(np.arange(hist.shape[0]), hist) for hist in self.lengths_of_physical_hist]
+
+    @property
+    def lengths_of_unphysical(self):
+        return [np.repeat(np.arange(hist.shape[0]), hist) for hist in self.lengths_of_unphysical_hist]
+
+    def save_log (self):
+
+        # Initial file : header
         if self.epoch == 0:
-            df0 = pd.DataFrame(columns=columns)
-            df0.to_csv(self.save_path, index=False)
+            columns = ['epoch', 'reward', 'complexity', 'length', 'is_physical', 'is_elite', 'program', "program_prefix"]
+            # Columns for free const names
+            columns += self.free_const_names
+            self.close_log()
+            self._log_file   = open(self.save_path, 'w', newline='', buffering=LOG_FILE_BUFFER_SIZE)
+            self._log_writer = csv.writer(self._log_file, lineterminator='\n')
+            self._log_writer.writerow(columns)
+        # Logging started after epoch 0 : appending to existing file
+        elif self._log_file is None:
+            self._log_file   = open(self.save_path, 'a', newline='', buffering=LOG_FILE_BUFFER_SIZE)
+            self._log_writer = csv.writer(self._log_file, lineterminator='\n')
 
         # Current batch log
-        is_elite = np.full(self.batch.batch_size, False)
+        batch_size = self.batch.batch_size
+        is_elite = np.full(batch_size, False)
         is_elite[self.keep] = True
-        programs_str = np.array([prog.get_infix_str() for prog in self.batch.programs.get_programs_array()])
+        programs_str        = [prog.get_infix_str() for prog in self.programs_epoch]
+        programs_prefix_str = [prog.__str__()       for prog in self.programs_epoch]
 
-        df = pd.DataFrame()
-        df["epoch"]          = np.full(self.batch.batch_size, self.epoch)
-        df["reward"]         = self.R
-        df["complexity"]     = self.batch.programs.n_complexity
-        df["length"]         = self.batch.programs.n_lengths
-        df["is_physical"]    = self.batch.programs.is_physical
-        df["is_elite"]       = is_elite
-        df["program"]        = programs_str
-        df["program_prefix"] = self.batch.programs.get_programs_array()
-
-        # Exporting free constants
+        # Exporting free constants (one column per free const)
         free_const = self.batch.programs.free_consts.values.detach().cpu().numpy()
-        for i in range(len(self.free_const_names)):
-            name   = self.free_const_names[i]
-            const  = free_const[:, i]
-            df[name] = const
 
-        # Saving current df
-        df.to_csv(self.save_path, mode='a', index=False, header=False)
+        # Saving current batch
+        self._log_writer.writerows(zip(
+            np.full(batch_size, self.epoch)        .tolist(),
+            floats_to_str(self.R),
+            floats_to_str(self.batch.programs.n_complexity),
+            self.batch.programs.n_lengths          .tolist(),
+            self.batch.programs.is_physical        .tolist(),
+            is_elite                               .tolist(),
+            programs_str,
+            programs_prefix_str,
+            *[floats_to_str(const) for const in free_const.T],
+        ))
+        # Flushing so the log on disk is complete at the end of each epoch
+        self._log_file.flush()
 
         return None
 
+    def close_log (self):
+        """
+        Closes log file if it is open.
+        """
+        if self._log_file is not None:
+            self._log_file.close()
+        self._log_file   = None
+        self._log_writer = None
+
     def pareto_logger(self,):
         curr_complexities = self.batch.programs.n_complexity
         curr_rewards      = self.R
@@ -170,42 +450,39 @@ class RunLogger:
             self.pareto_complexities  = np.arange(0,10*curr_batch.max_time_step)
             self.pareto_rewards       = np.full(shape=(self.pareto_complexities.shape), fill_value = np.NaN)
             self.pareto_programs      = np.full(shape=(self.pareto_complexities.shape), fill_value = None, dtype=object)
+            # Front computed from candidates (see get_pareto_front), None when candidates changed since last computed
+            self.pareto_front         = None
 
         # Update with current epoch info
-        for i,c in enumerate(self.pareto_complexities):
-            # Idx in batch of programs having complexity c
-            arg_have_c = np.argwhere(curr_complexities.round() == c)
-            if len(arg_have_c) > 0:
-                # Idx in batch of the program having complexity c and having max reward
-                arg_have_c_and_max = arg_have_c[curr_rewards[arg_have_c].argmax()]
-                # Max reward of this program
-                max_r_at_c = curr_rewards[arg_have_c_and_max]
-                # If reward > currently max reward for this complexity or empty, replace
-                if self.pareto_rewards[i] <= max_r_at_c or np.isnan(self.pareto_rewards[i]):
-                    self.pareto_programs [i] = curr_batch.programs.get_prog(arg_have_c_and_max[0])
-                    self.pareto_rewards  [i] = max_r_at_c
+        slots, arg_in_batch = get_pareto_update(complexities   = curr_complexities,
+                                                rewards        = curr_rewards,
+                                                pareto_rewards = self.pareto_rewards)
+        for i, arg in zip(slots, arg_in_batch):
+            self.pareto_programs [i] = curr_batch.programs.get_prog(arg)
+        self.pareto_rewards[slots] = curr_rewards[arg_in_batch]
+        if slots.shape[0] > 0:
+            self.pareto_front = None
 
     def get_pareto_front(self,):
+        # Front is only recomputed if candidates changed since last call
+        if self.pareto_front is None:
+            self.pareto_front = self.compute_pareto_front()
+        return self.pareto_front
+
+    def compute_pareto_front(self,):
         # Postprocessing
         # Keeping only valid pareto candidates
-        mask_pareto_valid = (~np.isnan(self.pareto_rewards)) & (self.pareto_rewards>0)
-        pareto_rewards_valid      = self.pareto_rewards      [mask_pareto_valid]
-        pareto_programs_valid     = self.pareto_programs     [mask_pareto_valid]
-        pareto_complexities_valid = self.pareto_complexities [mask_pareto_valid]
+        arg_valid            = np.flatnonzero((~np.isnan(self.pareto_rewards)) & (self.pareto_rewards>0))
+        pareto_rewards_valid = self.pareto_rewards[arg_valid]
         # Computing front
-        pareto_front_r            = [pareto_rewards_valid       [0]]
-        pareto_front_programs     = [pareto_programs_valid      [0]]
-        pareto_front_complexities = [pareto_complexities_valid  [0]]
-        for i,r in enumerate(pareto_rewards_valid):
-            # Only keeping candidates with higher reward than candidates having a smaller complexity
-            if r > pareto_front_r[-1]:
-                pareto_front_r            .append(r)
-                pareto_front_programs     .append(pareto_programs_valid     [i])
-                pareto_front_complexities .append(pareto_complexities_valid [i])
-
-        pareto_front_complexities = np.array(pareto_front_complexities)
-        pareto_front_programs     = np.array(pareto_front_programs)
-        pareto_front_r            = np.array(pareto_front_r)
+        # Only keeping candidates with higher reward than all candidates having a smaller complexity (candidates are
+        # sorted by complexity as pareto_complexities is)
+        max_r_at_smaller_c = np.maximum.accumulate(np.r_[-np.inf, pareto_rewards_valid[:-1]])
+        arg_front          = arg_valid[np.flatnonzero(pareto_rewards_valid > max_r_at_smaller_c[:arg_valid.shape[0]])]
+        # Gathering front candidates
+        pareto_front_complexities = self.pareto_complexities [arg_front]
+        pareto_front_programs     = self.pareto_programs     [arg_front]
+        pareto_front_r            = self.pareto_rewards      [arg_front]
         pareto_front_rmse         = ((1/pareto_front_r)-1)*self.batch.dataset.y_target.std().detach().cpu().numpy()
 
         return pareto_front_complexities, pareto_front_programs, pareto_front_r, pareto_front_rmse
@@ -218,6 +495,8 @@ class RunLogger:
 class RunVisualiser:
     """
     Custom run visualiser.
+    In notebooks, using the ipympl backend (%matplotlib widget) is recommended for live display : figure is then updated
+    in place rather than re-sent as a full image at each refresh.
     """
 
     def __init__ (self,
@@ -226,10 +505,18 @@ class RunVisualiser:
                   save_path = None,
                   do_show   = True,
                   do_prints = True,
-                  do_save   = False):
+                  do_save   = False,
+                  live_dpi  = 60,
+                  save_dpi  = 100,
+                  full_refresh_rate = 10):
         self.epoch_refresh_rate        = epoch_refresh_rate
         self.epoch_refresh_rate_prints = epoch_refresh_rate_prints
+        # Max number of refreshes between two redraws of expensive panels (see update_plot)
+        self.full_refresh_rate         = full_refresh_rate
         self.figsize   = (40,18)
+        # Large figure : rasterized at a lower resolution when displayed live than when saved
+        self.live_dpi  = live_dpi
+        self.save_dpi  = save_dpi
         self.save_path = save_path
         if save_path is not None:
             self.save_path_log        = ''.join(save_path.split('.')[:-1]) + "_data.csv"    # save_path with extension replaced by '_data.csv'
@@ -240,7 +527,10 @@ class RunVisualiser:
         self.do_prints = do_prints
 
     def initialize (self):
-        self.fig = plt.figure(figsize=self.figsize)
+        # Created with interactive mode off so interactive backends do not display figure a second time once cell is
+        # over (figure is displayed by make_visualisation)
+        with plt.ioff():
+            self.fig = plt.figure(figsize=self.figsize, dpi=self.live_dpi)
         gs  = gridspec.GridSpec(3, 3)
         self.ax0 = self.fig.add_subplot(gs[0, 0])
         self.ax1 = self.fig.add_subplot(gs[0, 1])
@@ -258,139 +548,191 @@ class RunVisualiser:
         div = make_axes_locatable(self.ax7)
         self.cax7 = div.append_axes("right", size="4%", pad=0.4)
 
-        self.t0 = time.perf_counter()
-
-    def update_plot (self,):
-        epoch      = self.run_logger.epoch
-        run_logger = self.run_logger
-        batch      = self.batch
-
+        # History curves are created once here, only their data is updated in update_plot
         # -------- Reward vs epoch --------
         curr_ax = self.ax0
-        curr_ax.clear()
-        curr_ax.plot(run_logger.epochs_history, run_logger.mean_R_history        , 'b'            , linestyle='solid' , alpha = 0.6, label="Mean")
-        curr_ax.plot(run_logger.epochs_history, run_logger.mean_R_train_history  , 'r'            , linestyle='solid' , alpha = 0.6, label="Mean train")
-        curr_ax.plot(run_logger.epochs_history, run_logger.overall_max_R_history , 'k'            , linestyle='solid' , alpha = 1.0, label="Overall Best")
-        curr_ax.plot(run_logger.epochs_history, run_logger.max_R_history         , color='orange' , linestyle='solid' , alpha = 0.6, label="Best of epoch")
+        self.line_mean_R,          = curr_ax.plot([], [], 'b'            , linestyle='solid' , alpha = 0.6, label="Mean")
+        self.line_mean_R_train,    = curr_ax.plot([], [], 'r'            , linestyle='solid' , alpha = 0.6, label="Mean train")
+        self.line_overall_max_R,   = curr_ax.plot([], [], 'k'            , linestyle='solid' , alpha = 1.0, label="Overall Best")
+        self.line_max_R,           = curr_ax.plot([], [], color='orange' , linestyle='solid' , alpha = 0.6, label="Best of epoch")
         curr_ax.set_ylabel("Reward")
         curr_ax.set_xlabel("Epochs")
         curr_ax.legend()
-
-        # -------- Reward distrbution vs epoch --------
-        curr_ax = self.ax1
-        cmap = plt.get_cmap("viridis")
-        fading_plot_nepochs       = epoch
-        fading_plot_ncurves       = 20
-        fading_plot_max_alpha     = 1.
-        fading_plot_bins          = 100
-        fading_plot_kde_bandwidth = 0.05
-        curr_ax.clear()
-        self.cax.clear()
-        # Plotting last "fading_plot_nepochs" epoch on "fading_plot_ncurves" curves
-        plot_epochs = []
-        for i in range (fading_plot_ncurves+1):
-            frac = i/fading_plot_ncurves
-            plot_epoch = int(epoch - frac*fading_plot_nepochs)
-            plot_epochs.append(plot_epoch)
-            prog = 1 - frac
-            alpha = fading_plot_max_alpha*(prog)
-            # Histogram
-            bins_dens = np.linspace(0., 1, fading_plot_bins)
-            kde = KernelDensity(kernel="gaussian", bandwidth=fading_plot_kde_bandwidth
-                               ).fit(run_logger.R_history_train_array[plot_epoch][:, np.newaxis])
-            dens = 10**kde.score_samples(bins_dens[:, np.newaxis])
-            # Plot
-            curr_ax.plot(bins_dens, dens, alpha=alpha, linewidth=0.5, c=cmap(prog))
-        # Colorbar
-        normcmap = plt.matplotlib.colors.Normalize(vmin=plot_epochs[0], vmax=plot_epochs[-1])
-        cbar = self.fig.colorbar(plt.cm.ScalarMappable(norm=normcmap, cmap=cmap), cax=self.cax, pad=0.005)
-        cbar.set_label('epochs', rotation=90,labelpad=30)
-        curr_ax.set_xlim([0, 1.])
-        curr_ax.set_ylabel("Density")
-        curr_ax.set_xlabel("Reward")
-
         # -------- Complexity --------
         curr_ax = self.ax2
-        curr_ax.clear()
-        curr_ax.plot(run_logger.epochs_history, run_logger.best_prog_complexity_history, 'orange', linestyle='solid'   ,  label="Best of epoch")
-        curr_ax.plot(run_logger.epochs_history, run_logger.mean_complexity_history     , 'b',      linestyle='solid'   ,  label="Mean")
+        self.line_best_prog_complexity, = curr_ax.plot([], [], 'orange', linestyle='solid'   ,  label="Best of epoch")
+        self.line_mean_complexity,      = curr_ax.plot([], [], 'b',      linestyle='solid'   ,  label="Mean")
         curr_ax.set_ylabel("Complexity")
         curr_ax.set_xlabel("Epochs")
         curr_ax.legend()
-
         # -------- Loss --------
         curr_ax = self.ax3
-        curr_ax.clear()
-        curr_ax.plot(run_logger.epochs_history, run_logger.loss_history, 'grey', label="loss")
+        self.line_loss, = curr_ax.plot([], [], 'grey', label="loss")
         curr_ax.set_ylabel("Loss")
         curr_ax.set_xlabel("Epochs")
         curr_ax.legend()
+        # -------- Number of physical progs --------
+        curr_ax = self.ax5
+        self.line_n_physical, = curr_ax.plot([], [], 'red'   , label="Physical count")
+        self.line_n_rewarded, = curr_ax.plot([], [], 'black' , label="Rewarded count")
+        curr_ax.set_xlabel("Epochs")
+        curr_ax.set_ylabel("Count")
+        curr_ax.legend()
+
+        # Dataset values used by fit plot : constant during run, moved to cpu once here rather than at each refresh
+        self.X_data_cpu = self.batch.dataset.X        .detach().cpu().numpy()   # (n_dim, data_size,)
+        self.y_data_cpu = self.batch.dataset.y_target .detach().cpu().numpy()   # (data_size,)
+        self.X_data_min = self.X_data_cpu.min(axis=1)                           # (n_dim,)
+        self.X_data_max = self.X_data_cpu.max(axis=1)                           # (n_dim,)
+        self.y_data_min = self.y_data_cpu.min()                                 # float
+        self.y_data_max = self.y_data_cpu.max()                                 # float
+
+        # Fit plot grid : depending only on dataset, built once
+        self.cut_on_dim = 0
+        self.X_plot, self.x_plot_cpu = self.build_X_plot(cut_on_dim = self.cut_on_dim)
+
+        # Live display state (see make_visualisation)
+        self.is_canvas_displayed = False
+
+        # Last refresh state (see update_plot)
+        self.last_drawn_epoch         = None
+        self.last_full_refresh_epoch  = None
+        self.last_drawn_overall_max_R = None
+        self.n_refreshes_since_full   = 0
+
+        # Pretty str of printed programs (see get_infix_pretty)
+        self.pretty_str_cache = {}
+
+        # Programs outputs on fit plotting grid (see eval_progs_on_plot)
+        self.y_plot_cache = collections.OrderedDict()
+
+        self.t0 = time.perf_counter()
+
+    def update_plot (self, do_full_refresh = False):
+        """
+        Updates figure with current epoch. History curves are updated at each call while expensive panels (reward and
+        lengths distributions, fit) are only redrawn when a new overall best program was found, every
+        full_refresh_rate refreshes or when forced.
+        Parameters
+        ----------
+        do_full_refresh : bool
+            Forces redrawing expensive panels (eg. before saving figure).
+        """
+        epoch         = self.run_logger.epoch
+        overall_max_R = self.run_logger.overall_max_R_history[-1]
+
+        # -------- History curves --------
+        # Skipped if already drawn at this epoch (eg. when both showing and saving plots)
+        if epoch != self.last_drawn_epoch:
+            self.update_history_panels()
+            self.last_drawn_epoch        = epoch
+            self.n_refreshes_since_full += 1
+
+        # -------- Expensive panels --------
+        # Refresh state is only updated once panels are drawn so they are redrawn next time if drawing failed
+        is_outdated = epoch != self.last_full_refresh_epoch
+        is_due      = (do_full_refresh
+                       or overall_max_R != self.last_drawn_overall_max_R
+                       or self.n_refreshes_since_full >= self.full_refresh_rate)
+        if is_outdated and is_due:
+            self.update_expensive_panels()
+            self.last_full_refresh_epoch  = epoch
+            self.last_drawn_overall_max_R = overall_max_R
+            self.n_refreshes_since_full   = 0
+
+        return None
+
+    def update_history_panels (self):
+        run_logger = self.run_logger
+
+        # -------- Reward vs epoch --------
+        curr_ax = self.ax0
+        self.line_mean_R        .set_data(run_logger.epochs_history, run_logger.mean_R_history        )
+        self.line_mean_R_train  .set_data(run_logger.epochs_history, run_logger.mean_R_train_history  )
+        self.line_overall_max_R .set_data(run_logger.epochs_history, run_logger.overall_max_R_history )
+        self.line_max_R         .set_data(run_logger.epochs_history, run_logger.max_R_history         )
+        curr_ax.relim()
+        curr_ax.autoscale_view()
+
+        # -------- Complexity --------
+        curr_ax = self.ax2
+        self.line_best_prog_complexity .set_data(run_logger.epochs_history, run_logger.best_prog_complexity_history)
+        self.line_mean_complexity      .set_data(run_logger.epochs_history, run_logger.mean_complexity_history     )
+        curr_ax.relim()
+        curr_ax.autoscale_view()
+
+        # -------- Loss --------
+        curr_ax = self.ax3
+        self.line_loss .set_data(run_logger.epochs_history, run_logger.loss_history)
+        curr_ax.relim()
+        curr_ax.autoscale_view()
+
+        # -------- Number of physical progs --------
+        curr_ax = self.ax5
+        self.line_n_physical .set_data(run_logger.epochs_history, run_logger.n_physical)
+        self.line_n_rewarded .set_data(run_logger.epochs_history, run_logger.n_rewarded)
+        curr_ax.relim()
+        curr_ax.autoscale_view()
+
+    def update_expensive_panels (self):
+        run_logger = self.run_logger
+        batch      = self.batch
+
+        # -------- Reward distrbution vs epoch --------
+        self.plot_fading_distributions(curr_ax         = self.ax1,
+                                       curr_cax        = self.cax,
+                                       distrib_history = run_logger.R_history_train_array,
+                                       x_max           = 1.,
+                                       bandwidth       = 0.05,
+                                       xlabel          = "Reward")
 
         # -------- Fit --------
         curr_ax = self.ax4
         curr_ax.clear()
         # Cut on dim
-        cut_on_dim = 0
-        x = batch.dataset.X[cut_on_dim]
-        # Plot data
-        x_expand = 0.
-        n_plot = 100
-        stack = []
-        for x_dim in batch.dataset.X:
-            x_dim_min = x_dim.min().detach().cpu().numpy()
-            x_dim_max = x_dim.max().detach().cpu().numpy()
-            x_dim_plot = torch.tensor(np.linspace(x_dim_min-x_expand, x_dim_max+x_expand, n_plot))
-            stack.append(x_dim_plot)
-        X_plot = torch.stack(stack).to(batch.dataset.detected_device)
-        x_plot = X_plot[cut_on_dim]
+        cut_on_dim = self.cut_on_dim
+        # Plot grid
+        X_plot     = self.X_plot
+        x_plot_cpu = self.x_plot_cpu
 
         # Data points
-        curr_ax.plot(x.detach().cpu().numpy(), batch.dataset.y_target.detach().cpu().numpy(), 'ko', markersize=10)
-        x_plot_cpu = x_plot.detach().cpu().numpy()
+        curr_ax.plot(self.X_data_cpu[cut_on_dim], self.y_data_cpu, 'ko', markersize=10)
 
         # ------- Prog drawing -------
-        unable_to_draw_a_prog = False
+        n_failed = 0
+        # Free constants of batch moved to cpu once (cache keys of programs drawn)
+        free_consts_cpu = batch.programs.free_consts.values.detach().cpu().numpy()
 
         # Best overall program
-        try:
-            y_plot = run_logger.best_prog(X_plot).detach().cpu().numpy()
-            if y_plot.shape == (): y_plot = np.full(n_plot, y_plot)
-            curr_ax.plot(x_plot_cpu, y_plot, color='k', linestyle='solid', linewidth=2)
-        except:
-            unable_to_draw_a_prog = True
+        y_plots, n_failed_curr = self.eval_progs_on_plot([run_logger.best_prog], X_plot)
+        curr_ax.plot(x_plot_cpu, y_plots.T, color='k', linestyle='solid', linewidth=2)
+        n_failed += n_failed_curr
 
         # Best program of epoch
-        try:
-            y_plot = run_logger.best_prog_epoch(X_plot).detach().cpu().numpy()
-            if y_plot.shape == (): y_plot = np.full(n_plot, y_plot)
-            curr_ax.plot(x_plot_cpu, y_plot, color='orange', linestyle='solid', linewidth=2)
-        except:
-            unable_to_draw_a_prog = True
+        y_plots, n_failed_curr = self.eval_progs_on_plot([run_logger.best_prog_epoch], X_plot,
+                                                         free_const_values = free_consts_cpu[[run_logger.R.argmax()]])
+        curr_ax.plot(x_plot_cpu, y_plots.T, color='orange', linestyle='solid', linewidth=2)
+        n_failed += n_failed_curr
 
         # Train programs
-        for prog in run_logger.programs_epoch[run_logger.keep]:
-            try:
-                y_plot =  prog(X_plot).detach().cpu().numpy()
-                if y_plot.shape == (): y_plot = np.full(n_plot, y_plot)
-                curr_ax.plot(x_plot_cpu, y_plot, color='r', alpha=0.05, linestyle='solid')
-            except:
-                unable_to_draw_a_prog = True
+        y_plots, n_failed_curr = self.eval_progs_on_plot(run_logger.programs_epoch[run_logger.keep], X_plot,
+                                                         free_const_values = free_consts_cpu[run_logger.keep])
+        curr_ax.plot(x_plot_cpu, y_plots.T, color='r', alpha=0.05, linestyle='solid')
+        n_failed += n_failed_curr
 
         # Other programs
-        for prog in run_logger.programs_epoch[run_logger.notkept]:
-            try:
-                y_plot =  prog(X_plot).detach().cpu().numpy()
-                if y_plot.shape == (): y_plot = np.full(n_plot, y_plot)
-                curr_ax.plot(x_plot_cpu, y_plot, color='b', alpha=0.05, linestyle='solid')
-            except:
-                unable_to_draw_a_prog = True
+        y_plots, n_failed_curr = self.eval_progs_on_plot(run_logger.programs_epoch[run_logger.notkept], X_plot,
+                                                         free_const_values = free_consts_cpu[run_logger.notkept])
+        curr_ax.plot(x_plot_cpu, y_plots.T, color='b', alpha=0.05, linestyle='solid')
+        n_failed += n_failed_curr
 
+        unable_to_draw_a_prog = n_failed > 0
         if unable_to_draw_a_prog:
             print("Unable to draw one or more prog curve on monitoring plot.")
 
         # ------- Plot limits -------
-        y_min = batch.dataset.y_target.min().detach().cpu().numpy()
-        y_max = batch.dataset.y_target.max().detach().cpu().numpy()
+        y_min = self.y_data_min
+        y_max = self.y_data_max
         curr_ax.set_ylim(y_min-0.1*np.abs(y_min), y_max+0.1*np.abs(y_max))
         custom_lines = [
             Line2D([0], [0], color='k',      lw=3),
@@ -399,93 +741,160 @@ class RunVisualiser:
             Line2D([0], [0], color='b',      lw=3),]
         curr_ax.legend(custom_lines, ['Overall Best', 'Best of epoch', 'Train', 'Others'])
 
-        # -------- Number of physical progs --------
-        curr_ax = self.ax5
-        curr_ax.clear()
-        curr_ax.plot(run_logger.epochs_history, run_logger.n_physical, 'red'   , label="Physical count")
-        curr_ax.plot(run_logger.epochs_history, run_logger.n_rewarded, 'black' , label="Rewarded count")
-        curr_ax.set_xlabel("Epochs")
-        curr_ax.set_ylabel("Count")
-        curr_ax.legend()
-
         # -------- Lengths of physical distribution vs epoch --------
-        curr_ax  = self.ax6
-        curr_cax = self.cax6
-
-        cmap = plt.get_cmap("viridis")
-        fading_plot_nepochs       = epoch
-        fading_plot_ncurves       = 20
-        fading_plot_max_alpha     = 1.
-        fading_plot_bins          = 100
-        fading_plot_kde_bandwidth = 1.
-        curr_ax.clear()
-        curr_cax.clear()
-        # Plotting last "fading_plot_nepochs" epoch on "fading_plot_ncurves" curves
-        plot_epochs = []
-        for i in range (fading_plot_ncurves+1):
-            frac = i/fading_plot_ncurves
-            plot_epoch = int(epoch - frac*fading_plot_nepochs)
-            plot_epochs.append(plot_epoch)
-            prog = 1 - frac
-            alpha = fading_plot_max_alpha*(prog)
-            # Distribution data
-            distrib_data = self.run_logger.lengths_of_physical[plot_epoch]
-            # If non empty selection, compute pdf and plot it
-            if distrib_data.shape[0] > 0:
-                # Histogram
-                bins_dens = np.linspace(0., self.run_logger.batch.max_time_step, fading_plot_bins)
-                kde = KernelDensity(kernel="gaussian", bandwidth=fading_plot_kde_bandwidth
-                                   ).fit(distrib_data[:, np.newaxis])
-                dens = 10**kde.score_samples(bins_dens[:, np.newaxis])
-                # Plot
-                curr_ax.plot(bins_dens, dens, alpha=alpha, linewidth=0.5, c=cmap(prog))
-        # Colorbar
-        normcmap = plt.matplotlib.colors.Normalize(vmin=plot_epochs[0], vmax=plot_epochs[-1])
-        cbar = self.fig.colorbar(plt.cm.ScalarMappable(norm=normcmap, cmap=cmap), cax=curr_cax, pad=0.005)
-        cbar.set_label('epochs', rotation=90,labelpad=30)
-        curr_ax.set_xlim([0, self.run_logger.batch.max_time_step])
-        curr_ax.set_ylabel("Density")
-        curr_ax.set_xlabel("Lengths (physical)")
+        self.plot_fading_distributions(curr_ax         = self.ax6,
+                                       curr_cax        = self.cax6,
+                                       distrib_history = run_logger.lengths_of_physical_hist,
+                                       x_max           = batch.max_time_step,
+                                       bandwidth       = 1.,
+                                       is_binned       = True,
+                                       xlabel          = "Lengths (physical)")
 
         # -------- Lengths of unphysical distribution vs epoch --------
-        curr_ax  = self.ax7
-        curr_cax = self.cax7
-        curr_fig = self.fig
+        self.plot_fading_distributions(curr_ax         = self.ax7,
+                                       curr_cax        = self.cax7,
+                                       distrib_history = run_logger.lengths_of_unphysical_hist,
+                                       x_max           = batch.max_time_step,
+                                       bandwidth       = 1.,
+                                       is_binned       = True,
+                                       xlabel          = "Lengths (unphysical)")
+
+    def build_X_plot (self, cut_on_dim = 0, n_plot = 100, x_expand = 0.):
+        """
+        Builds fit plot grid spanning dataset range along each input dimension.
+        Parameters
+        ----------
+        cut_on_dim : int
+            Dimension along which curves are plotted.
+        n_plot : int
+            Number of points of grid.
+        x_expand : float
+            Margin added on both sides of dataset range.
+        Returns
+        -------
+        X_plot, x_plot_cpu : torch.tensor of shape (n_dim, n_plot,) of float, numpy.array of shape (n_plot,) of float
+            Grid (on dataset device), grid along cut dimension.
+        """
+        stack = []
+        for x_dim_min, x_dim_max in zip(self.X_data_min, self.X_data_max):
+            x_dim_plot = torch.tensor(np.linspace(x_dim_min-x_expand, x_dim_max+x_expand, n_plot))
+            stack.append(x_dim_plot)
+        X_plot     = torch.stack(stack).to(self.batch.dataset.detected_device)
+        x_plot_cpu = X_plot[cut_on_dim].detach().cpu().numpy()
+        return X_plot, x_plot_cpu
+
+    def eval_progs_on_plot (self, progs, X_plot, free_const_values = None):
+        """
+        Evaluates programs on plotting grid. Results are memoized by program content (tokens and free constants values)
+        as most programs drawn at a refresh were already drawn at a previous one (the grid depending only on the dataset,
+        the cache is reset in initialize). Outputs of programs missing from cache are moved to cpu in a single transfer.
+        Parameters
+        ----------
+        progs : array_like of program.Program
+            Programs to evaluate.
+        X_plot : torch.tensor of shape (n_dim, n_plot,) of float
+            Plotting grid.
+        free_const_values : numpy.array of shape (?, n_free_const,) of float or None
+            Free constants values of programs already on cpu (used as cache keys). If None, they are read from programs
+            (one transfer per program).
+        Returns
+        -------
+        y_plots, n_failed : numpy.array of shape (?, n_plot,) of float, int
+            Outputs on grid of programs that could be evaluated, number of programs that could not be evaluated.
+        """
+        n_plot = X_plot.shape[1]
+        if free_const_values is None:
+            free_const_values = [None if prog.free_const_values is None else prog.free_const_values.detach().cpu().numpy()
+                                 for prog in progs]
+        keys = []
+        for prog, prog_free_const_values in zip(progs, free_const_values):
+            free_const_key = b'' if prog_free_const_values is None else np.asarray(prog_free_const_values).tobytes()
+            keys.append((tuple(tok.name for tok in prog.tokens), free_const_key))
+
+        # Evaluating programs missing from cache (outputs are kept on device until all are computed)
+        new_y_plots = {}
+        failed_keys = set()
+        for prog, key in zip(progs, keys):
+            if key in self.y_plot_cache or key in new_y_plots or key in failed_keys:
+                continue
+            try:
+                y_plot = prog(X_plot).detach()
+                if y_plot.shape == (): y_plot = y_plot.expand(n_plot)
+                if y_plot.shape != (n_plot,): raise ValueError("Program output does not match plotting grid.")
+                new_y_plots[key] = y_plot
+            except:
+                failed_keys.add(key)
+        if len(new_y_plots) > 0:
+            new_y_plots_cpu = torch.stack(list(new_y_plots.values())).cpu().numpy()
+            self.y_plot_cache.update(zip(new_y_plots.keys(), new_y_plots_cpu))
+
+        y_plots = []
+        for key in keys:
+            if key not in failed_keys:
+                self.y_plot_cache.move_to_end(key)
+                y_plots.append(self.y_plot_cache[key])
+        # Evicting least recently used results
+        while len(self.y_plot_cache) > Y_PLOT_CACHE_SIZE:
+            self.y_plot_cache.popitem(last=False)
+
+        y_plots  = np.array(y_plots).reshape(-1, n_plot)
+        n_failed = len(keys) - y_plots.shape[0]
+        return y_plots, n_failed
+
+    def plot_fading_distributions (self, curr_ax, curr_cax, distrib_history, x_max, bandwidth, xlabel, is_binned = False):
+        """
+        Plots distributions of a quantity over past epochs as curves fading with age alongside an epochs colorbar.
+        Parameters
+        ----------
+        curr_ax : matplotlib.axes.Axes
+            Axes to plot distributions on.
+        curr_cax : matplotlib.axes.Axes
+            Axes to plot colorbar on.
+        distrib_history : indexable by epoch of numpy.array of shape (?,) of float
+            Samples of quantity at each epoch (or histograms of quantity at each epoch if is_binned).
+        x_max : float
+            Upper bound of distributions range (lower bound being 0).
+        bandwidth : float
+            Standard deviation of gaussian kernel used for density estimation.
+        xlabel : str
+            Label of quantity.
+        is_binned : bool
+            If True, distrib_history is a numpy.array of shape (n_epochs, x_max+1,) of int containing counts of an
+            integer quantity (ranging from 0 to x_max) at each epoch.
+        """
+        epoch = self.run_logger.epoch
 
         cmap = plt.get_cmap("viridis")
         fading_plot_nepochs       = epoch
         fading_plot_ncurves       = 20
         fading_plot_max_alpha     = 1.
         fading_plot_bins          = 100
-        fading_plot_kde_bandwidth = 1.
         curr_ax.clear()
         curr_cax.clear()
         # Plotting last "fading_plot_nepochs" epoch on "fading_plot_ncurves" curves
-        plot_epochs = []
-        for i in range (fading_plot_ncurves+1):
-            frac = i/fading_plot_ncurves
-            plot_epoch = int(epoch - frac*fading_plot_nepochs)
-            plot_epochs.append(plot_epoch)
+        fracs       = np.arange(fading_plot_ncurves+1)/fading_plot_ncurves
+        plot_epochs = (epoch - fracs*fading_plot_nepochs).astype(int)
+        # Densities of all curves at once
+        if is_binned:
+            bins_dens = np.arange(distrib_history.shape[1]).astype(float)
+            dens      = smooth_histograms(distrib_history[plot_epochs], bin_width = 1., bandwidth = bandwidth)
+        else:
+            bins_dens, dens = smoothed_densities([distrib_history[plot_epoch] for plot_epoch in plot_epochs],
+                                                 x_min = 0., x_max = x_max,
+                                                 n_bins = fading_plot_bins, bandwidth = bandwidth)
+        for i, frac in enumerate(fracs):
             prog = 1 - frac
             alpha = fading_plot_max_alpha*(prog)
-            # Distribution data
-            distrib_data = self.run_logger.lengths_of_unphysical[plot_epoch]
-            # If non empty selection, compute pdf and plot it
-            if distrib_data.shape[0] > 0:
-                # Histogram
-                bins_dens = np.linspace(0., self.run_logger.batch.max_time_step, fading_plot_bins)
-                kde = KernelDensity(kernel="gaussian", bandwidth=fading_plot_kde_bandwidth
-                                   ).fit(distrib_data[:, np.newaxis])
-                dens = 10**kde.score_samples(bins_dens[:, np.newaxis])
-                # Plot
-                curr_ax.plot(bins_dens, dens, alpha=alpha, linewidth=0.5, c=cmap(prog))
+            # If non empty selection, plot pdf
+            if not np.isnan(dens[i]).any():
+                curr_ax.plot(bins_dens, dens[i], alpha=alpha, linewidth=0.5, c=cmap(prog))
         # Colorbar
         normcmap = plt.matplotlib.colors.Normalize(vmin=plot_epochs[0], vmax=plot_epochs[-1])
-        cbar = curr_fig.colorbar(plt.cm.ScalarMappable(norm=normcmap, cmap=cmap), cax=curr_cax, pad=0.005)
+        cbar = self.fig.colorbar(plt.cm.ScalarMappable(norm=normcmap, cmap=cmap), cax=curr_cax, pad=0.005)
         cbar.set_label('epochs', rotation=90,labelpad=30)
-        curr_ax.set_xlim([0, self.batch.max_time_step])
+        curr_ax.set_xlim([0, x_max])
         curr_ax.set_ylabel("Density")
-        curr_ax.set_xlabel("Lengths (unphysical)")
+        curr_ax.set_xlabel(xlabel)
 
     def make_prints(self):
         t1 = self.t0
@@ -497,12 +906,12 @@ class RunVisualiser:
 
         # Overall best
         print("\nOverall best  at R=%f"%(self.run_logger.overall_max_R_history[-1]))
-        print("-> Raw expression : \n%s"%(self.run_logger.best_prog.get_infix_pretty(do_simplify=False, )))
+        print("-> Raw expression : \n%s"%(self.get_infix_pretty(self.run_logger.best_prog)))
         #print("  -> Simplified expression : \n%s"%(run_logger.best_prog.get_infix_pretty(do_simplify=True , )))
 
         # Best of epoch
-        print("\nBest of epoch at R=%f"%(self.run_logger.R.max()))
-        print("-> Raw expression : \n%s"%(self.run_logger.best_prog_epoch.get_infix_pretty(do_simplify=False, )))
+        print("\nBest of epoch at R=%f"%(self.run_logger.max_R_history[-1]))
+        print("-> Raw expression : \n%s"%(self.get_infix_pretty(self.run_logger.best_prog_epoch)))
         print("\n")
         #print("  -> Simplified expression : \n%s"%(run_logger.best_prog_epoch.get_infix_pretty(do_simplify=True , )))
 
@@ -514,12 +923,49 @@ class RunVisualiser:
         #    print("------------------------------------------------------------")
         #print("*****************************************************************************************************************")
 
+    def get_infix_pretty (self, prog):
+        """
+        Returns raw (not simplified) pretty infix str of program. Results are memoized for the last programs printed
+        as the overall best program rarely changes from one print to another.
+        Parameters
+        ----------
+        prog : program.Program
+            Program to print.
+        Returns
+        -------
+        pretty_str : str
+        """
+        # Cache is keyed by id but holds programs so their ids can not be reused by other programs
+        cached = self.pretty_str_cache.get(id(prog))
+        if cached is not None and cached[0] is prog:
+            return cached[1]
+        pretty_str = prog.get_infix_pretty(do_simplify=False, )
+        self.pretty_str_cache[id(prog)] = (prog, pretty_str)
+        # Evicting oldest result
+        if len(self.pretty_str_cache) > PRETTY_STR_CACHE_SIZE:
+            del self.pretty_str_cache[next(iter(self.pretty_str_cache))]
+        return pretty_str
+
     def make_visualisation (self):
         # -------- Plot update --------
         self.update_plot()
         # -------- Display --------
-        display(self.fig)
-        clear_output(wait=True)
+        # Interactive canvas (ipympl) : displayed once then updated in place (only changed pixels are sent)
+        if self.is_interactive_canvas():
+            if not self.is_canvas_displayed:
+                display(self.fig.canvas)
+                self.is_canvas_displayed = True
+            self.fig.canvas.draw()
+        # Static backends : re-displaying figure as an image
+        else:
+            display(self.fig)
+            clear_output(wait=True)
+
+    def is_interactive_canvas (self):
+        """
+        Is figure drawn on an ipympl interactive canvas (ie. when running in a notebook with %matplotlib widget) ?
+        """
+        return type(self.fig.canvas).__module__.startswith("ipympl")
 
     def get_curves_data_df (self):
         df = pd.DataFrame()
@@ -635,9 +1081,10 @@ class RunVisualiser:
 
     def save_visualisation (self):
         # -------- Plot update --------
-        self.update_plot()
+        # Saved figure is always fully up to date
+        self.update_plot(do_full_refresh = True)
         # -------- Save plot --------
-        self.fig.savefig(self.save_path)
+        self.fig.savefig(self.save_path, dpi=self.save_dpi)
         return None
 
     def visualise (self, run_logger, batch):
@@ -0,0 +1,435 @@
+import unittest
+import types
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import torch
+import matplotlib.pyplot as plt
+
+# Internal imports
+from physo.learn import monitoring
+from physo.physym import batch
+from physo.physym import reward
+from physo.physym.functions import data_conversion
+
+def pareto_update_loop (complexities, rewards, pareto_rewards, pareto_args):
+    """
+    Reference Pareto candidates update (per complexity loop), updates pareto_rewards and pareto_args (idx in batch of
+    candidates) in place.
+    """
+    for c in range(pareto_rewards.shape[0]):
+        # Idx in batch of programs having complexity c
+        arg_have_c = np.argwhere(complexities.round() == c)
+        if len(arg_have_c) > 0:
+            # Idx in batch of the program having complexity c and having max reward
+            arg_have_c_and_max = arg_have_c[rewards[arg_have_c].argmax()]
+            max_r_at_c = rewards[arg_have_c_and_max]
+            # If reward > currently max reward for this complexity or empty, replace
+            if pareto_rewards[c] <= max_r_at_c or np.isnan(pareto_rewards[c]):
+                pareto_args    [c] = arg_have_c_and_max[0]
+                pareto_rewards [c] = max_r_at_c[0]
+    return None
+
+def pareto_update_vect (complexities, rewards, pareto_rewards, pareto_args):
+    """
+    Pareto candidates update using monitoring.get_pareto_update, updates pareto_rewards and pareto_args in place.
+    """
+    slots, arg_in_batch = monitoring.get_pareto_update(complexities   = complexities,
+                                                       rewards        = rewards,
+                                                       pareto_rewards = pareto_rewards)
+    pareto_args    [slots] = arg_in_batch
+    pareto_rewards [slots] = rewards[arg_in_batch]
+    return None
+
+def pareto_front_sweep (pareto_complexities, pareto_programs, pareto_rewards):
+    """
+    Reference Pareto front computation (sweep over valid candidates).
+    """
+    mask_pareto_valid = (~np.isnan(pareto_rewards)) & (pareto_rewards>0)
+    pareto_rewards_valid      = pareto_rewards      [mask_pareto_valid]
+    pareto_programs_valid     = pareto_programs     [mask_pareto_valid]
+    pareto_complexities_valid = pareto_complexities [mask_pareto_valid]
+    pareto_front_r            = [pareto_rewards_valid       [0]]
+    pareto_front_programs     = [pareto_programs_valid      [0]]
+    pareto_front_complexities = [pareto_complexities_valid  [0]]
+    for i,r in enumerate(pareto_rewards_valid):
+        if r > pareto_front_r[-1]:
+            pareto_front_r            .append(r)
+            pareto_front_programs     .append(pareto_programs_valid     [i])
+            pareto_front_complexities .append(pareto_complexities_valid [i])
+    return np.array(pareto_front_complexities), np.array(pareto_front_programs), np.array(pareto_front_r)
+
+def make_pareto_logger (pareto_rewards, y_target_std = 2.):
+    """
+    Returns RunLogger having pareto_rewards as Pareto candidates rewards (candidate i being program "prog_i").
+    """
+    run_logger = monitoring.RunLogger()
+    n_complexities = pareto_rewards.shape[0]
+    run_logger.pareto_complexities = np.arange(n_complexities)
+    run_logger.pareto_rewards      = pareto_rewards
+    run_logger.pareto_programs     = np.array(["prog_%i"%(i) for i in range(n_complexities)], dtype=object)
+    run_logger.pareto_front        = None
+    # Only dataset is used by front computation
+    y_target = torch.tensor([-y_target_std, y_target_std])*np.sqrt(0.5)
+    run_logger.batch = types.SimpleNamespace(dataset = types.SimpleNamespace(y_target = y_target))
+    return run_logger
+
+def make_dummy_batch (batch_size = 50, max_time_step = 10):
+    """
+    Returns batch having free constants, filled with random programs.
+    """
+    # --- DATA ---
+    N = int(1e2)
+    x_array = np.linspace(0.04, 4, N)
+    X = torch.stack((data_conversion(x_array),), axis=0)
+    y_target = data_conversion(x_array/1.028 + 0.995)
+    # --- LIBRARY CONFIG ---
+    args_make_tokens = {
+                    # operations
+                    "op_names"             : ["add", "div"],
+                    "use_protected_ops"    : True,
+                    # input variables
+                    "input_var_ids"        : {"x" : 0         },
+                    "input_var_units"      : {"x" : [1, 0, 0] },
+                    "input_var_complexity" : {"x" : 0.        },
+                    # constants
+                    "constants"            : {"const1" : data_conversion(1.) },
+                    "constants_units"      : {"const1" : [0, 0, 0]           },
+                    "constants_complexity" : {"const1" : 1.                  },
+                    # free constants
+                    "free_constants"            : {"T"              , "v0"              ,},
+                    "free_constants_init_val"   : {"T" : 1.         , "v0" : 1.         ,},
+                    "free_constants_units"      : {"T" : [0, 1, 0] , "v0" : [1, -1, 0] ,},
+                    "free_constants_complexity" : {"T" : 0.         , "v0" : 0.         ,},
+                        }
+    library_args = {"args_make_tokens"  : args_make_tokens,
+                    "superparent_units" : [1, -1, 0],
+                    "superparent_name"  : "v",
+                    }
+    # --- PRIORS ---
+    priors_config  = [ ("UniformArityPrior", None),
+                       ("HardLengthPrior", {"min_length": 1,
+                                           "max_length": max_time_step, }),]
+    # --- BATCH ---
+    my_batch = batch.Batch(library_args     = library_args,
+                           priors_config    = priors_config,
+                           batch_size       = batch_size,
+                           max_time_step    = max_time_step,
+                           rewards_computer = reward.make_RewardsComputer (reward_function = reward.SquashedNRMSE),
+                           X        = X,
+                           y_target = y_target,
+                           )
+    # --- RANDOM PROGRAMS ---
+    for step in range(max_time_step):
+        prior   = torch.tensor(my_batch.prior().astype(np.float32))
+        probs   = torch.tensor(np.random.rand(my_batch.batch_size, my_batch.library.n_choices).astype(np.float32))
+        actions = torch.multinomial(probs * prior, num_samples=1)[:, 0]
+        my_batch.programs.append(actions)
+    return my_batch
+
+def log_epoch (run_logger, epoch, my_batch, rewards, n_keep = 10):
+    """
+    Logs an epoch of my_batch having rewards (elite programs being the n_keep programs having the highest rewards).
+    """
+    keep    = rewards.argsort()[::-1][0:n_keep].copy()
+    notkept = rewards.argsort()[::-1][n_keep: ].copy()
+    run_logger.log(epoch    = epoch,
+                   batch    = my_batch,
+                   model    = None,
+                   rewards  = rewards,
+                   keep     = keep,
+                   notkept  = notkept,
+                   loss_val = torch.tensor(0.5))
+    return keep
+
+class MonitoringTest(unittest.TestCase):
+
+    def test_get_pareto_update (self):
+
+        def check (complexities, rewards, pareto_rewards, expected_rewards = None, expected_args = None):
+            pareto_args = np.full(pareto_rewards.shape, -1)
+            # Reference
+            ref_rewards, ref_args = pareto_rewards.copy(), pareto_args.copy()
+            pareto_update_loop (complexities, rewards, ref_rewards, ref_args)
+            # Vectorized
+            vect_rewards, vect_args = pareto_rewards.copy(), pareto_args.copy()
+            pareto_update_vect (complexities, rewards, vect_rewards, vect_args)
+            # Test
+            np.testing.assert_array_equal(vect_rewards, ref_rewards)
+            np.testing.assert_array_equal(vect_args,    ref_args)
+            if expected_rewards is not None:
+                np.testing.assert_array_equal(vect_rewards, expected_rewards)
+            if expected_args is not None:
+                np.testing.assert_array_equal(vect_args, expected_args)
+
+        nan = np.NaN
+
+        # Ties within batch : first program in batch order wins
+        check(complexities     = np.array([1. , 1. , 2. , 1. , 2. ]),
+              rewards          = np.array([0.3, 0.5, 0.2, 0.5, 0.2]),
+              pareto_rewards   = np.full(4, nan),
+              expected_rewards = np.array([nan, 0.5, 0.2, nan]),
+              expected_args    = np.array([-1 , 1  , 2  , -1 ]))
+
+        # NaN slots are always filled, filled slots are only replaced by higher or equal rewards
+        check(complexities     = np.array([0. , 1. , 2. , 3. ]),
+              rewards          = np.array([0.1, 0.4, 0.5, 0.6]),
+              pareto_rewards   = np.array([nan, 0.4, 0.9, 0.2]),
+              expected_rewards = np.array([0.1, 0.4, 0.9, 0.6]),
+              expected_args    = np.array([0  , 1  , -1 , 3  ]))
+
+        # Complexities are rounded, complexities outside [0, n_complexities) are ignored
+        check(complexities     = np.array([-3. , -0.4, 0.4, 3.6 , 4.  , 12. , 2.5]),
+              rewards          = np.array([0.9 , 0.1 , 0.2, 0.3 , 0.99, 0.99, 0.7]),
+              pareto_rewards   = np.full(4, nan),
+              expected_rewards = np.array([0.2 , nan , 0.7, nan ]),
+              expected_args    = np.array([2   , -1  , 6  , -1  ]))
+
+        # Empty batch
+        check(complexities     = np.array([]),
+              rewards          = np.array([]),
+              pareto_rewards   = np.array([nan, 0.5]),
+              expected_rewards = np.array([nan, 0.5]))
+
+        # Random cases (ties being frequent)
+        rng = np.random.default_rng(seed = 0)
+        for _ in range(500):
+            batch_size     = rng.integers(1, 50)
+            n_complexities = rng.integers(1, 20)
+            complexities   = rng.integers(-2, n_complexities + 3, size = batch_size).astype(float)
+            rewards        = rng.integers(0, 5, size = batch_size)/4
+            pareto_rewards = rng.integers(0, 5, size = n_complexities)/4
+            pareto_rewards[rng.random(n_complexities) < 0.3] = nan
+            check(complexities, rewards, pareto_rewards)
+
+        return None
+
+    def test_compute_pareto_front (self):
+
+        nan = np.NaN
+
+        def check (pareto_rewards):
+            run_logger = make_pareto_logger(pareto_rewards)
+            complexities, programs, r, rmse = run_logger.compute_pareto_front()
+            ref_complexities, ref_programs, ref_r = pareto_front_sweep(run_logger.pareto_complexities,
+                                                                       run_logger.pareto_programs,
+                                                                       run_logger.pareto_rewards)
+            np.testing.assert_array_equal(complexities, ref_complexities)
+            np.testing.assert_array_equal(programs,     ref_programs)
+            np.testing.assert_array_equal(r,            ref_r)
+            np.testing.assert_allclose(rmse, ((1/ref_r)-1)*2., rtol=1e-6)
+
+        # Invalid (NaN or zero rewards) candidates are skipped, front is strictly increasing in reward
+        check(np.array([nan, 0. , 0.2, 0.1, 0.2, 0.5, nan, 0.4, 0.9, 0.9]))
+        # Random cases
+        rng = np.random.default_rng(seed = 0)
+        for _ in range(500):
+            n_complexities = rng.integers(1, 30)
+            pareto_rewards = rng.integers(0, 8, size = n_complexities)/7
+            pareto_rewards[rng.random(n_complexities) < 0.3] = nan
+            if ((~np.isnan(pareto_rewards)) & (pareto_rewards > 0)).any():
+                check(pareto_rewards)
+
+        # No valid candidate : empty front
+        run_logger = make_pareto_logger(np.array([nan, 0., nan]))
+        complexities, programs, r, rmse = run_logger.compute_pareto_front()
+        for arr in (complexities, programs, r, rmse):
+            self.assertEqual(arr.shape, (0,))
+
+        # Front is cached until candidates change
+        run_logger = make_pareto_logger(np.array([nan, 0.3, 0.6]))
+        front = run_logger.get_pareto_front()
+        self.assertIs(run_logger.get_pareto_front(), front)
+
+        return None
+
+    def test_save_log (self):
+
+        np.random.seed(0)
+        batch_size = 50
+        my_batch = make_dummy_batch(batch_size = batch_size)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            save_path     = os.path.join(tmp_dir, "run.log")
+            ref_save_path = os.path.join(tmp_dir, "run_ref.log")
+            run_logger = monitoring.RunLogger(save_path = save_path, do_save = True)
+
+            for epoch in range(3):
+                # Rewards and free constants containing NaNs
+                rewards = np.random.rand(batch_size)
+                rewards[np.random.rand(batch_size) < 0.2] = np.NaN
+                free_const_values = torch.rand(batch_size, 2, dtype=torch.float64)
+                free_const_values[torch.rand(batch_size, 2) < 0.2] = np.NaN
+                my_batch.programs.free_consts.values = free_const_values
+                keep = log_epoch(run_logger, epoch, my_batch, rewards)
+
+                # Reference : exporting epoch with pandas
+                columns = ['epoch', 'reward', 'complexity', 'length', 'is_physical', 'is_elite', 'program', "program_prefix"]
+                columns += run_logger.free_const_names
+                if epoch == 0:
+                    pd.DataFrame(columns=columns).to_csv(ref_save_path, index=False)
+                is_elite = np.full(batch_size, False)
+                is_elite[keep] = True
+                df = pd.DataFrame()
+                df["epoch"]          = np.full(batch_size, epoch)
+                df["reward"]         = rewards
+                df["complexity"]     = my_batch.programs.n_complexity
+                df["length"]         = my_batch.programs.n_lengths
+                df["is_physical"]    = my_batch.programs.is_physical
+                df["is_elite"]       = is_elite
+                df["program"]        = np.array([prog.get_infix_str() for prog in my_batch.programs.get_programs_array()])
+                df["program_prefix"] = my_batch.programs.get_programs_array()
+                for i, name in enumerate(run_logger.free_const_names):
+                    df[name] = free_const_values.numpy()[:, i]
+                df.to_csv(ref_save_path, mode='a', index=False, header=False)
+
+            run_logger.close_log()
+            self.assertIsNone(run_logger._log_file)
+
+            with open(save_path, 'rb') as f:
+                log = f.read()
+            with open(ref_save_path, 'rb') as f:
+                ref_log = f.read()
+
+        # Test
+        self.assertNotIn(b'\r\n', log)
+        # NaNs exported as empty fields
+        self.assertIn(b',,', log)
+        self.assertEqual(log.count(b'\n'), 1 + 3*batch_size)
+        self.assertEqual(log, ref_log)
+
+        return None
+
+    def test_smoothed_densities (self):
+
+        rng = np.random.default_rng(seed = 0)
+        x_min, x_max, n_bins = 0., 1., 100
+        bin_width = (x_max - x_min)/n_bins
+
+        # Densities integrate to 1 when all samples are in range (far from bounds wrt bandwidth)
+        samples = [rng.uniform(0.3, 0.7, size = size) for size in (1, 10, 500)]
+        bins_centers, dens = monitoring.smoothed_densities(samples, x_min = x_min, x_max = x_max, n_bins = n_bins,
+                                                           bandwidth = 0.05)
+        self.assertEqual(bins_centers.shape, (n_bins,))
+        self.assertEqual(dens.shape, (3, n_bins))
+        np.testing.assert_allclose(dens.sum(axis=1)*bin_width, 1., rtol=1e-3)
+
+        # Within 1% of peak density of exact gaussian KDE
+        for bandwidth in (0.05, 0.1):
+            data = rng.normal(0.5, 0.1, size = 500)
+            bins_centers, dens = monitoring.smoothed_densities([data], x_min = x_min, x_max = x_max, n_bins = n_bins,
+                                                               bandwidth = bandwidth)
+            data_in_range = data[(data >= x_min) & (data <= x_max)]
+            kde = np.exp(-0.5*((bins_centers[:, np.newaxis] - data_in_range[np.newaxis, :])/bandwidth)**2).sum(axis=1)
+            kde = kde/(data_in_range.shape[0]*bandwidth*np.sqrt(2*np.pi))
+            self.assertLess(np.abs(dens[0] - kde).max(), 0.01*kde.max())
+
+        # Samples at bounds are in first and last bins, out of range samples are discarded, empty sets give NaNs
+        samples = [np.array([x_min]), np.array([x_max]), np.array([-0.5, x_max, 1.5]), np.array([]), np.array([2.])]
+        bins_centers, dens = monitoring.smoothed_densities(samples, x_min = x_min, x_max = x_max, n_bins = n_bins,
+                                                           bandwidth = 1e-6)
+        self.assertEqual(dens[0].argmax(), 0)
+        self.assertEqual(dens[1].argmax(), n_bins - 1)
+        np.testing.assert_array_equal(dens[2], dens[1])
+        self.assertTrue(np.isnan(dens[3]).all())
+        self.assertTrue(np.isnan(dens[4]).all())
+        self.assertFalse(np.isnan(dens[:3]).any())
+
+        return None
+
+    def test_smooth_histograms (self):
+
+        # Densities integrate to 1, empty histograms give NaNs
+        hist = np.array([[0, 0, 0, 0, 3, 5, 2, 0, 0, 0, 0, 0],
+                         [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+                         [0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0],])
+        dens = monitoring.smooth_histograms(hist, bin_width = 1., bandwidth = 1.)
+        self.assertEqual(dens.shape, hist.shape)
+        np.testing.assert_allclose(dens[[0, 2]].sum(axis=1), 1., rtol=1e-3)
+        self.assertTrue(np.isnan(dens[1]).all())
+        # Single sample : density peaks at its bin
+        self.assertEqual(dens[2].argmax(), 6)
+
+        return None
+
+    def test_plot_fading_distributions (self):
+
+        # Empty epochs are not plotted
+        n_epochs = 21
+        samples  = [np.array([0.2, 0.4, 0.5]) if epoch%2 == 0 else np.array([]) for epoch in range(n_epochs)]
+        run_visualiser = monitoring.RunVisualiser(do_show = False)
+        run_visualiser.run_logger = types.SimpleNamespace(epoch = n_epochs - 1)
+        run_visualiser.fig = plt.figure()
+        curr_ax, curr_cax = run_visualiser.fig.subplots(1, 2)
+        try:
+            run_visualiser.plot_fading_distributions(curr_ax         = curr_ax,
+                                                     curr_cax        = curr_cax,
+                                                     distrib_history = samples,
+                                                     x_max           = 1.,
+                                                     bandwidth       = 0.05,
+                                                     xlabel          = "Reward")
+            # 21 curves (epochs 20, 19, ..., 0), only the 11 non empty epochs being plotted
+            self.assertEqual(len(curr_ax.lines), 11)
+        finally:
+            plt.close(run_visualiser.fig)
+
+        return None
+
+    def test_history_buffers (self):
+
+        np.random.seed(0)
+        batch_size = 20
+        n_keep     = 5
+        my_batch   = make_dummy_batch(batch_size = batch_size)
+        run_logger = monitoring.RunLogger()
+
+        # Logging more epochs than initial capacity (buffers being doubled twice)
+        n_epochs = 2*monitoring.HISTORY_BUFFER_INIT_CAPACITY + 1
+        rewards_history = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Same epochs logged with rewards history in memory-mapped file
+            memmap_run_logger = monitoring.RunLogger(save_path = os.path.join(tmp_dir, "run.log"), do_save = True,
+                                                     do_memmap = True)
+            for epoch in range(n_epochs):
+                rewards = np.random.rand(batch_size)
+                log_epoch(run_logger,        epoch, my_batch, rewards, n_keep = n_keep)
+                log_epoch(memmap_run_logger, epoch, my_batch, rewards, n_keep = n_keep)
+                rewards_history.append(rewards)
+            memmap_run_logger.close_log()
+            self.assertIsInstance(memmap_run_logger._buffers["R_history"], np.memmap)
+            np.testing.assert_array_equal(memmap_run_logger.R_history_array, rewards_history)
+            del memmap_run_logger
+        rewards_history = np.array(rewards_history)
+
+        # Test capacity
+        self.assertEqual(run_logger._buffers["R_history"].shape[0], 4*monitoring.HISTORY_BUFFER_INIT_CAPACITY)
+
+        # Test views
+        np.testing.assert_array_equal(run_logger.epochs_history        , np.arange(n_epochs))
+        np.testing.assert_array_equal(run_logger.R_history_array       , rewards_history)
+        np.testing.assert_array_equal(run_logger.R_history             , rewards_history)
+        np.testing.assert_array_equal(run_logger.max_R_history         , rewards_history.max(axis=1))
+        np.testing.assert_array_equal(run_logger.overall_max_R_history , np.maximum.accumulate(rewards_history.max(axis=1)))
+        np.testing.assert_array_equal(run_logger.mean_R_history        , rewards_history.mean(axis=1))
+        np.testing.assert_array_equal(run_logger.R_history_train_array , -np.sort(-rewards_history, axis=1)[:, :n_keep])
+        np.testing.assert_array_equal(run_logger.n_physical            , np.full(n_epochs, my_batch.programs.is_physical.sum()))
+        self.assertEqual(run_logger.lengths_of_physical_hist.shape, (n_epochs, my_batch.max_time_step + 1))
+        np.testing.assert_array_equal(run_logger.lengths_of_physical_hist.sum(axis=1) +
+                                      run_logger.lengths_of_unphysical_hist.sum(axis=1), np.full(n_epochs, batch_size))
+        # Lengths rebuilt from histograms (sorted)
+        n_lengths, is_physical = my_batch.programs.n_lengths, my_batch.programs.is_physical
+        self.assertEqual(len(run_logger.lengths_of_physical), n_epochs)
+        np.testing.assert_array_equal(run_logger.lengths_of_physical   [-1], np.sort(n_lengths[ is_physical]))
+        np.testing.assert_array_equal(run_logger.lengths_of_unphysical [-1], np.sort(n_lengths[~is_physical]))
+        # Test dtypes
+        self.assertEqual(run_logger.epochs_history        .dtype, np.asarray(0).dtype)
+        self.assertEqual(run_logger.R_history_array       .dtype, rewards_history.dtype)
+        self.assertEqual(run_logger.loss_history          .dtype, torch.tensor(0.5).numpy().dtype)
+        self.assertEqual(run_logger.n_physical            .dtype, my_batch.programs.is_physical.sum().dtype)
+        self.assertEqual(run_logger.lengths_of_physical_hist.dtype, np.bincount([0]).dtype)
+
+        return None
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -94,7 +94,9 @@ def SR(X, y,
     run_config : dict (optional)
         Run configuration (by default uses physo.task.sr.default_config)
     get_run_logger : callable returning physo.learn.monitoring.RunLogger (optional)
-        Run logger (by default uses physo.task.sr.get_default_run_logger)
+        Run logger (by default uses physo.task.sr.get_default_run_logger). The default logger writes the log of all
+        programs to 'SR.log' in the working directory, this file is overwritten by the next run and is otherwise left
+        on disk. Reward histories are kept in memory (no other file is written by the logger).
     get_run_visualiser : callable returning physo.learn.monitoring.RunVisualiser (optional)
         Run visualiser (by default uses physo.task.sr.get_default_run_visualiser)
 